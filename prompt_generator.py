@@ -1,14 +1,132 @@
-from typing import List, Dict, Any, Optional
-from pydantic import BaseModel
+import functools
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import List, Dict, Any, Optional, Tuple
 
+# Reads file, code and similarity from a similar-code entry in one call
+_get_similar_fields = itemgetter('file', 'code', 'similarity')
 
-class CodeBlock(BaseModel):
+# Change-type bits for the style review prompt
+_CHANGE_DELETED = 0b01
+_CHANGE_ADDED = 0b10
+
+
+@dataclass(slots=True, frozen=True)
+class CodeBlock:
     start_line: int
     end_line: int
     code: str
     line_count: int
 
 
+# Marks a chunk without a code attribute, so a real None value is kept
+_MISSING = object()
+
+
+def _get_code(chunk: Any) -> str:
+    """Return the code of a CodeBlock or a plain dict chunk."""
+    code = getattr(chunk, 'code', _MISSING)
+    return code if code is not _MISSING else chunk.get('code', '')
+
+
+@functools.lru_cache(maxsize=1024)
+def _clean_code_cached(code: str) -> str:
+    """Strip code and remove common leading whitespace (memoized)."""
+    lines = code.strip().splitlines()
+
+    # Find the common leading whitespace in a single pass over the lines,
+    # blanking whitespace-only lines so they need no second check
+    min_indent = None
+    for i, line in enumerate(lines):
+        stripped = line.lstrip()
+        if not stripped:
+            lines[i] = ""
+            continue
+
+        indent = len(line) - len(stripped)
+        if min_indent is None or indent < min_indent:
+            min_indent = indent
+
+    if min_indent is None:
+        return ""
+
+    return '\n'.join([line[min_indent:] for line in lines])
+
+
+@functools.lru_cache(maxsize=512)
+def _build_style_review_prompt(
+    added_codes: Tuple[str, ...],
+    deleted_codes: Tuple[str, ...],
+    full_function_code: str,
+    function_name: str
+) -> str:
+    """Build the style review prompt from raw added/deleted code strings (memoized)."""
+
+    # Format added and deleted code, skipping blocks that are or clean to nothing
+    added_blocks = [
+        f"```python\n{c}\n```" for c in map(_clean_code_cached, filter(None, added_codes)) if c
+    ]
+    deleted_blocks = [
+        f"```python\n{c}\n```" for c in map(_clean_code_cached, filter(None, deleted_codes)) if c
+    ]
+
+    # Determine context strategy based on change types
+    mode = (bool(added_blocks) << 1) | bool(deleted_blocks)
+
+    # Format context section
+    context_section = ""
+    if full_function_code:
+        clean_full = _clean_code_cached(full_function_code)
+
+        if mode == _CHANGE_DELETED:
+            # For deletions only, show it as "current state after removal"
+            context_section = f"Current function `{function_name}` (after removal):\n```python\n{clean_full}\n```\n"
+        elif mode & _CHANGE_ADDED:
+            # For additions or mixed changes, show as current state
+            context_section = f"Full function `{function_name}`:\n```python\n{clean_full}\n```\n"
+
+    # Adjust instruction based on change type
+    instruction_context = ""
+    if mode == _CHANGE_DELETED:
+        instruction_context = " The function shown above is the current state after the removal."
+
+    # Build the changes section
+    parts = []
+    if added_blocks:
+        parts.extend(("ADDED:\n", "\n".join(added_blocks), "\n"))
+    if deleted_blocks:
+        if mode == _CHANGE_DELETED:
+            parts.append("REMOVED (these lines were deleted from the function above):\n")
+        else:
+            parts.append("REMOVED:\n")
+        parts.extend(("\n".join(deleted_blocks), "\n"))
+
+    changes_section = "".join(parts) or "No code changes detected.\n"
+
+    # Build the prompt with very clear instructions
+    prompt = f"""You are a code reviewer. Analyze this Python code change and respond EXACTLY in the format below.{instruction_context}
+
+{context_section}{changes_section}
+
+You MUST respond in this EXACT format (copy the headers exactly):
+
+SUMMARY: [One sentence describing what changed]
+
+ISSUES: [List specific bugs/problems, or write "None found"]
+
+IMPROVEMENTS: [Suggest specific improvements, or write "None needed"]
+
+DECISION: [Yes/No] - [One sentence reason]
+
+Do not add extra text or explanations outside this format."""
+
+    return prompt.strip()
+
+
+# Style review prompt for a payload with no changes and no function code
+_EMPTY_STYLE_PROMPT = _build_style_review_prompt.__wrapped__((), (), "", "")
+
+
 class CodeReviewPromptGenerator:
     def __init__(self):
         pass
@@ -18,25 +136,7 @@ class CodeReviewPromptGenerator:
         if not code:
             return code
 
-        lines = code.strip().splitlines()
-        if not lines:
-            return ""
-
-        # Remove common leading whitespace
-        non_empty_lines = [line for line in lines if line.strip()]
-        if not non_empty_lines:
-            return ""
-
-        min_indent = min(len(line) - len(line.lstrip()) for line in non_empty_lines)
-
-        cleaned_lines = []
-        for line in lines:
-            if line.strip():
-                cleaned_lines.append(line[min_indent:])
-            else:
-                cleaned_lines.append("")
-
-        return '\n'.join(cleaned_lines)
+        return _clean_code_cached(code)
 
     def generate_style_review_prompt(
         self,
@@ -47,81 +147,22 @@ class CodeReviewPromptGenerator:
     ) -> str:
         """Generate a concise code review prompt with strict format enforcement."""
 
-        # Format added code
-        added_blocks = []
-        for i, chunk in enumerate(added_code, 1):
-            if isinstance(chunk, CodeBlock):
-                code = chunk.code
-            else:
-                code = chunk.get('code', '')
-
-            clean_code = self._clean_code(code)
-            if clean_code:
-                added_blocks.append(f"```python\n{clean_code}\n```")
-
-        # Format deleted code
-        deleted_blocks = []
-        for i, chunk in enumerate(deleted_code, 1):
-            if isinstance(chunk, CodeBlock):
-                code = chunk.code
-            else:
-                code = chunk.get('code', '')
-
-            clean_code = self._clean_code(code)
-            if clean_code:
-                deleted_blocks.append(f"```python\n{clean_code}\n```")
-
-        # Determine context strategy based on change types
-        has_additions = bool(added_blocks)
-        has_deletions = bool(deleted_blocks)
-
-        # Format context section
-        context_section = ""
-        if full_function_code:
-            clean_full = self._clean_code(full_function_code)
-
-            if has_deletions and not has_additions:
-                # For deletions only, show it as "current state after removal"
-                context_section = f"Current function `{function_name}` (after removal):\n```python\n{clean_full}\n```\n"
-            elif has_additions or (has_additions and has_deletions):
-                # For additions or mixed changes, show as current state
-                context_section = f"Full function `{function_name}`:\n```python\n{clean_full}\n```\n"
-
-        # Build the prompt with very clear instructions
-        changes_section = ""
-        if added_blocks:
-            changes_section += f"ADDED:\n{chr(10).join(added_blocks)}\n"
-        if deleted_blocks:
-            if has_deletions and not has_additions:
-                changes_section += f"REMOVED (these lines were deleted from the function above):\n{chr(10).join(deleted_blocks)}\n"
-            else:
-                changes_section += f"REMOVED:\n{chr(10).join(deleted_blocks)}\n"
-
-        if not changes_section:
-            changes_section = "No code changes detected.\n"
-
-        # Adjust instruction based on change type
-        instruction_context = ""
-        if has_deletions and not has_additions:
-            instruction_context = " The function shown above is the current state after the removal."
-
-        prompt = f"""You are a code reviewer. Analyze this Python code change and respond EXACTLY in the format below.{instruction_context}
-
-{context_section}{changes_section}
-
-You MUST respond in this EXACT format (copy the headers exactly):
-
-SUMMARY: [One sentence describing what changed]
-
-ISSUES: [List specific bugs/problems, or write "None found"]
-
-IMPROVEMENTS: [Suggest specific improvements, or write "None needed"]
-
-DECISION: [Yes/No] - [One sentence reason]
+        if not added_code and not deleted_code and not full_function_code:
+            return _EMPTY_STYLE_PROMPT
 
-Do not add extra text or explanations outside this format."""
+        added_codes = tuple(map(_get_code, added_code))
+        deleted_codes = tuple(map(_get_code, deleted_code))
 
-        return prompt.strip()
+        # Reuse a previously built prompt for identical inputs
+        try:
+            return _build_style_review_prompt(
+                added_codes, deleted_codes, full_function_code, function_name
+            )
+        except TypeError:
+            # Unhashable inputs, build without caching
+            return _build_style_review_prompt.__wrapped__(
+                added_codes, deleted_codes, full_function_code, function_name
+            )
 
     def generate_duplication_check_prompt(
         self,
@@ -138,11 +179,18 @@ Do not add extra text or explanations outside this format."""
 
         # Only use the most similar code to avoid confusion
         most_similar = similar_codes[0]
-        file_path = most_similar.get('file', 'unknown_file')
-        similar_code = most_similar.get('code', '')
-        similarity_score = most_similar.get('similarity', 'N/A')
-
-        clean_similar = self._clean_code(similar_code)
+        try:
+            file_path, similar_code, similarity_score = _get_similar_fields(most_similar)
+        except KeyError:
+            file_path = most_similar.get('file', 'unknown_file')
+            similar_code = most_similar.get('code', '')
+            similarity_score = most_similar.get('similarity', 'N/A')
+
+        # Retrievers that store normalized code can set 'code_clean' to skip cleaning
+        if most_similar.get('code_clean'):
+            clean_similar = similar_code
+        else:
+            clean_similar = self._clean_code(similar_code)
 
         prompt = f"""Check for code duplication. Respond EXACTLY in the format below.
 
@@ -176,24 +224,36 @@ Do not add extra text."""
     ) -> str:
         """Generate a very focused summary prompt."""
 
-        # Extract key info from previous results
-        def extract_key_info(result: str, keyword: str) -> str:
+        # Extract key info from previous results in a single scan each
+        def extract_key_info(result: str, keywords: Tuple[str, ...]) -> Dict[str, str]:
             if not result or "sorry" in result.lower():
-                return "No issues"
-
-            # Look for the specific information we need
-            lines = result.split('\n')
-            for line in lines:
-                if keyword.upper() in line.upper():
+                return {}
+
+            # For each keyword, take the first line containing it that has a colon
+            found = {}
+            pending = list(keywords)
+            for line in result.split('\n'):
+                if ':' not in line:
+                    continue
+
+                upper_line = line.upper()
+                matched = [keyword for keyword in pending if keyword in upper_line]
+                if matched:
                     # Extract just the content after the colon
-                    if ':' in line:
-                        return line.split(':', 1)[1].strip()
-            return "No issues"
+                    value = line.split(':', 1)[1].strip()
+                    for keyword in matched:
+                        found[keyword] = value
+                        pending.remove(keyword)
+                    if not pending:
+                        break
+            return found
 
         # Extract actual findings, not the review format
-        style_issues = extract_key_info(style_result, "ISSUES")
-        style_decision = extract_key_info(style_result, "DECISION")
-        dup_level = extract_key_info(duplication_result, "DUPLICATION LEVEL")
+        style_info = extract_key_info(style_result, ("ISSUES", "DECISION"))
+        style_issues = style_info.get("ISSUES", "No issues")
+        style_decision = style_info.get("DECISION", "No issues")
+        dup_info = extract_key_info(duplication_result, ("DUPLICATION LEVEL",))
+        dup_level = dup_info.get("DUPLICATION LEVEL", "No issues")
 
         prompt = f"""Based on these code review results for function `{function_name}`, make a final decision:
 
@@ -231,6 +291,11 @@ Focus on the CODE QUALITY, not the review format."""
             function_name=function_name
         )
 
+    def generate_style_review_prompts(self, payloads: List[Dict[str, Any]]) -> List[str]:
+        """Generate review prompts for a batch of payloads."""
+
+        return [self.generate_contextual_review_prompt(payload_data) for payload_data in payloads]
+
 
 # Even more minimal version for better model compliance
 class MinimalCodeReviewPrompts:
@@ -239,7 +304,10 @@ class MinimalCodeReviewPrompts:
 
     def _clean_code(self, code: str) -> str:
         """Basic code cleaning."""
-        return code.strip()[:400] if code else ""  # Limit length
+        if not code:
+            return ""
+
+        return code[:400].strip()  # Limit length before stripping
 
     def generate_review_prompt(
         self,
@@ -252,31 +320,23 @@ class MinimalCodeReviewPrompts:
         # Get the main code blocks
         added_text = ""
         if added_code:
-            first_added = added_code[0]
-            if isinstance(first_added, CodeBlock):
-                added_text = first_added.code
-            else:
-                added_text = first_added.get('code', '')
+            added_text = _get_code(added_code[0])
 
         deleted_text = ""
         if deleted_code:
-            first_deleted = deleted_code[0]
-            if isinstance(first_deleted, CodeBlock):
-                deleted_text = first_deleted.code
-            else:
-                deleted_text = first_deleted.get('code', '')
-
-        prompt = f"""Code review for function `{function_name}`. Answer in EXACT format below.
-
-"""
+            deleted_text = _get_code(deleted_code[0])
 
+        parts = []
         if added_text:
-            prompt += f"NEW CODE:\n```python\n{self._clean_code(added_text)}\n```\n"
+            parts.extend(("NEW CODE:\n```python\n", self._clean_code(added_text), "\n```\n"))
 
         if deleted_text:
-            prompt += f"REMOVED CODE:\n```python\n{self._clean_code(deleted_text)}\n```\n"
+            parts.extend(("REMOVED CODE:\n```python\n", self._clean_code(deleted_text), "\n```\n"))
+        changes_section = "".join(parts)
+
+        return f"""Code review for function `{function_name}`. Answer in EXACT format below.
 
-        prompt += """
+{changes_section}
 Format your response EXACTLY like this:
 
 ISSUES: [List problems or "None"]
@@ -285,8 +345,6 @@ REASON: [One sentence]
 
 No other text allowed."""
 
-        return prompt
-
     def generate_duplication_prompt(
         self,
         code_snippet: str,
@@ -336,9 +394,11 @@ Do not comment on the review process itself."""
 
 
 # Factory function to choose the right prompt generator
+@functools.lru_cache(maxsize=32)
 def get_prompt_generator(model_name: str = ""):
-    """Select appropriate prompt generator based on model."""
-    if "deepseek" in model_name.lower() or "coder" in model_name.lower():
+    """Select appropriate prompt generator based on model (one shared instance per name)."""
+    name = model_name.lower()
+    if "deepseek" in name or "coder" in name:
         return MinimalCodeReviewPrompts()
     else:
         return CodeReviewPromptGenerator()